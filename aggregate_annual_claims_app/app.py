@@ -1,34 +1,85 @@
 # app.py
 
-import os
-import joblib
-import pandas as pd
+from functools import lru_cache
+
+import numpy as np
+import orjson
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
+from pydantic import BaseModel, Field, ValidationError
+
+from resources import (
+    forecast_for_year,
+    get_model_version,
+    get_year_to_row,
+    predict_rows,
+    preload,
+)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Serializes JSON with orjson, which is much faster than the standard library.
+
+    orjson always writes compact output, so Flask's indent/separator arguments are
+    ignored. OPT_SERIALIZE_NUMPY lets responses contain NumPy values directly.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 # 1. Initialize the Flask App
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+# Compress responses with gzip/brotli when the client accepts it
+Compress(app)
+
+# How long clients may reuse a forecast before revalidating it with its ETag
+FORECAST_CACHE_CONTROL = "public, max-age=3600"
 
-# 2. Load our trained model and scaler
+# 2. Load our trained model, scaler, and historical data (see resources.py)
 try:
-    # Resolve absolute paths relative to this file so it works no matter where it's run from
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    MODELS_DIR = os.path.join(BASE_DIR, "models")
-    DATA_DIR = os.path.join(BASE_DIR, "data")
-
-    model_path = os.path.join(MODELS_DIR, "aggregate_claims_forecaster.pkl")
-    scaler_path = os.path.join(MODELS_DIR, "aggregate_data_scaler.pkl")
-    data_path = os.path.join(DATA_DIR, "aggregate_annual_claims.csv")
-
-    model = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
-    # Load historical data to get the latest available year for forecasting
-    historical_data = pd.read_csv(data_path)
+    # Load everything up front, so gunicorn's preloading shares it with the workers
+    # (the ONNX session, if any, is created per worker; see gunicorn.conf.py)
+    preload()
+    YEAR_TO_ROW = get_year_to_row()
+    resources_loaded = True
     print("Model, scaler, and historical data loaded successfully.")
 except Exception as e:
     print(f"Error loading files: {e}")
-    model = None
-    scaler = None
-    historical_data = None
+    YEAR_TO_ROW = {}
+    resources_loaded = False
+
+
+# Python's round() and np.round() can disagree on the last cent (22125.175 becomes
+# 22125.17 vs 22125.18), and the API has always returned NumPy's result. Rounding
+# is cached with the forecast, so NumPy only runs once per year, not per response.
+@lru_cache(maxsize=None)
+def _rounded_forecast_for_year(year):
+    """Returns the year's forecast rounded to 2 decimals the way NumPy does."""
+    return float(np.round(forecast_for_year(year), 2))
+
+
+# The expected shape of a /predict request body
+class PredictRequest(BaseModel):
+    # The year whose data is used as features; numeric strings such as "2020" also work
+    year: int
+
+
+# The expected shape of a /predict_batch request body
+class PredictBatchRequest(BaseModel):
+    # The years whose data are used as features, one forecast per year
+    years: list[int] = Field(min_length=1)
+
+
+@app.errorhandler(ValidationError)
+def handle_validation_error(e):
+    """Rejects requests whose JSON body doesn't match the expected schema."""
+    return jsonify({"error": e.errors(include_url=False, include_context=False)}), 400
 
 
 # 3. Define the API endpoint for predictions
@@ -38,84 +89,85 @@ def predict():
     This function handles prediction requests.
     It expects a POST request with JSON data for the latest year.
     """
-    if model is None or scaler is None:
+    if not resources_loaded:
         return jsonify({"error": "Model or scaler not loaded"}), 500
 
-    # Get the JSON data sent to the endpoint
-    input_data = request.get_json()
+    # Get the JSON data sent to the endpoint and validate it; a malformed body
+    # raises ValidationError, which handle_validation_error turns into a 400
+    input_data = PredictRequest.model_validate(request.get_json())
+
+    # The input tells us which year's data to use as features
+    year_to_use = input_data.year
+    if year_to_use not in YEAR_TO_ROW:
+        return jsonify({"error": f"No data found for year {year_to_use}"}), 400
+
+    # A year's forecast is identical until the model, data, or serving backend
+    # change, so a client that already holds it (sent back as If-None-Match)
+    # doesn't need it again
+    etag = f"{year_to_use}-{get_model_version()}"
+    # If-None-Match uses weak comparison (RFC 9110 §13.1.2), so a tag a proxy
+    # marked weak (W/"…") after re-encoding the body still matches
+    if request.if_none_match.contains_weak(etag):
+        not_modified = app.response_class(status=304)
+        not_modified.set_etag(etag)
+        # A 304 repeats the 200's caching rules so the revalidated copy stays fresh
+        not_modified.headers["Cache-Control"] = FORECAST_CACHE_CONTROL
+        return not_modified
 
-    # --- Data Preparation for a single prediction ---
-    # We need to construct the feature vector (the lagged data)
-    # For a real app, you might query a database. Here, we'll use our CSV.
     try:
-        # The input should tell us which year's data to use as features
-        # Ensure year is an integer (handle string input gracefully)
-        year_to_use = int(input_data["year"])
-        latest_year_data = historical_data[historical_data["Year"] == year_to_use]
-
-        if latest_year_data.empty:
-            return jsonify({"error": f"No data found for year {year_to_use}"}), 400
-
-        # Build lagged features that match the training schema (…_lag1)
-        base_feature_cols = [
-            "Subject employees",
-            "Denied claims",
-            "Fatality claims",
-            "Rate: accepted disabling claims per 100 employees",
-        ]
+        forecast = _rounded_forecast_for_year(year_to_use)
+    except ValueError as e:
+        # The model rejects feature rows it can't use (e.g. years with missing values)
+        return jsonify({"error": str(e)}), 400
+
+    # --- Create the JSON response ---
+    response = {
+        "forecast_for_year": year_to_use + 1,
+        "predicted_disabling_claims": forecast,
+    }
+    resp = jsonify(response)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = FORECAST_CACHE_CONTROL
+    return resp
+
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    """
+    This function handles batch prediction requests.
+    It expects a POST request with JSON data listing several years.
+    """
+    if not resources_loaded:
+        return jsonify({"error": "Model or scaler not loaded"}), 500
+
+    input_data = PredictBatchRequest.model_validate(request.get_json())
+    years = input_data.years
+
+    missing_years = [year for year in years if year not in YEAR_TO_ROW]
+    if missing_years:
+        return jsonify({"error": f"No data found for years {missing_years}"}), 400
 
-        # Validate required base columns exist
-        missing = [c for c in base_feature_cols if c not in latest_year_data.columns]
-        if missing:
-            return (
-                jsonify({"error": f"Missing required columns in data: {missing}"}),
-                500,
-            )
-
-        # Map base features to lagged feature names using the provided year's values
-        lagged_feature_row = {
-            f"{col}_lag1": latest_year_data.iloc[0][col] for col in base_feature_cols
-        }
-        feature_vector = pd.DataFrame([lagged_feature_row])
-
-        # Reorder columns to match the scaler's expected order if available
-        if hasattr(scaler, "feature_names_in_"):
-            expected_cols = list(scaler.feature_names_in_)
-            # Ensure all expected columns are present
-            missing_expected = [
-                c for c in expected_cols if c not in feature_vector.columns
-            ]
-            if missing_expected:
-                return (
-                    jsonify(
-                        {
-                            "error": f"Prepared features missing expected columns: {missing_expected}"
-                        }
-                    ),
-                    500,
-                )
-            feature_vector = feature_vector[expected_cols]
-
-        # Scale the features using our pre-fitted scaler
-        scaled_feature_vector = scaler.transform(feature_vector)
-
-        # Make a prediction
-        prediction = model.predict(scaled_feature_vector)
-
-        # The prediction is a numpy array, so we get the first element
-        forecast = prediction[0]
-
-        # --- Create the JSON response ---
-        response = {
-            "forecast_for_year": year_to_use + 1,
-            "predicted_disabling_claims": round(forecast, 2),
-        }
-        return jsonify(response)
-
-    except Exception as e:
-        # Handle potential errors in the input data or processing
+    # Gather every requested year's row at once and run the model a single time
+    rows = np.array([YEAR_TO_ROW[year] for year in years], dtype=np.intp)
+    try:
+        predictions = predict_rows(rows)
+    except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
+    # Round the whole batch in one vectorized call, in float64 like /predict
+    predictions = np.round(predictions.astype(np.float64, copy=False), 2).tolist()
+
+    response = {
+        "forecasts": [
+            {
+                "forecast_for_year": year + 1,
+                "predicted_disabling_claims": forecast,
+            }
+            for year, forecast in zip(years, predictions)
+        ]
+    }
+    return jsonify(response)
+
 
 # 4. A simple root endpoint to check if the server is running
 @app.route("/")
@@ -125,5 +177,10 @@ def home():
 
 # 5. Run the app
 if __name__ == "__main__":
+    # Local development only; in production gunicorn serves the app (see gunicorn.conf.py).
+    # gunicorn doesn't run on Windows, where waitress is a good alternative:
+    #     waitress-serve --threads=8 --port=5000 app:app
     # The app will be accessible at http://127.0.0.1:5000
-    app.run(port=5000, debug=True)
+    # Handle requests on threads: they all share the loaded model, scaler, and data,
+    # which predict() only ever reads
+    app.run(port=5000, threaded=True)
@@ -0,0 +1,43 @@
+# export_onnx.py
+
+# Converts the trained forecaster to ONNX so the app and UI can serve it with
+# ONNX Runtime. Run it once after retraining, from any directory:
+#
+#     pip install skl2onnx==1.17.0
+#     python export_onnx.py
+
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+from resources import (
+    MODEL_PATH,
+    ONNX_PATH,
+    ONNX_SOURCE_HASH_KEY,
+    file_sha256,
+    get_model,
+)
+
+model = get_model()
+
+# Opsets the pinned onnxruntime (see requirements.txt) can load; without this,
+# skl2onnx stamps the file with the newest opset it knows, which may be too new
+TARGET_OPSET = {"": 17, "ai.onnx.ml": 3}
+
+# The app scales every year's features once at startup, so the exported graph
+# only needs the model itself and takes already-scaled float32 features
+onnx_model = convert_sklearn(
+    model,
+    initial_types=[("input", FloatTensorType([None, model.n_features_in_]))],
+    target_opset=TARGET_OPSET,
+)
+
+# Record which pickle this export came from; the app ignores the export once the
+# pickle is replaced, until this script is run again
+source_hash = onnx_model.metadata_props.add()
+source_hash.key = ONNX_SOURCE_HASH_KEY
+source_hash.value = file_sha256(MODEL_PATH)
+
+with open(ONNX_PATH, "wb") as f:
+    f.write(onnx_model.SerializeToString())
+
+print(f"ONNX model saved to {ONNX_PATH}")
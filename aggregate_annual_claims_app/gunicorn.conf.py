@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+
+import multiprocessing
+
+# Listen on all interfaces so the API is reachable from outside the container
+bind = "0.0.0.0:5000"
+
+# One worker process per CPU core, each serving a few requests at once on threads
+workers = multiprocessing.cpu_count()
+worker_class = "gthread"
+threads = 4
+
+# Load the model, scaler, and data once in the parent process before forking.
+# They are only read after loading, so the workers share that memory
+# instead of each loading its own copy.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # ONNX Runtime's thread pool doesn't survive fork(), so each worker creates
+    # its own session here, before it starts serving requests, and then
+    # fingerprints the model it will actually serve
+    from resources import get_model_version, get_onnx_session
+
+    get_onnx_session()
+    get_model_version()
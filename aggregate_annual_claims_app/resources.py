@@ -0,0 +1,273 @@
+# resources.py
+
+# Loads the trained model, scaler, and historical data used by both app.py and ui.py.
+# Each loader runs at most once per process and caches its result, so whichever
+# module asks first pays the loading cost and everyone else shares the same objects.
+
+import hashlib
+import os
+from functools import lru_cache
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from sklearn.preprocessing import StandardScaler
+
+# ONNX Runtime is optional; without it we fall back to the scikit-learn model
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Resolve absolute paths relative to this file so it works no matter where it's run from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
+MODEL_PATH = os.path.join(MODELS_DIR, "aggregate_claims_forecaster.pkl")
+SCALER_PATH = os.path.join(MODELS_DIR, "aggregate_data_scaler.pkl")
+ONNX_PATH = os.path.join(MODELS_DIR, "aggregate_claims_forecaster.onnx")
+DATA_PATH = os.path.join(DATA_DIR, "aggregate_annual_claims.csv")
+
+# The raw features the model was trained on; it sees the previous year's values (…_lag1)
+BASE_FEATURE_COLS = [
+    "Subject employees",
+    "Denied claims",
+    "Fatality claims",
+    "Rate: accepted disabling claims per 100 employees",
+]
+LAGGED_COLS = [f"{col}_lag1" for col in BASE_FEATURE_COLS]
+
+# Declaring the types of the columns we use lets the CSV reader skip inferring them.
+# The model's features stay float64, the precision it was trained on: rounding them
+# to float32 moves some years across a split threshold and changes the forecast.
+# The year and the plotted claims are only displayed, so 32 bits are enough there.
+COLUMN_TYPES = {
+    "Year": pa.int32(),
+    **{col: pa.float64() for col in BASE_FEATURE_COLS},
+    "Accepted disabling claims": pa.float32(),
+}
+
+
+# Key under which export_onnx.py records the SHA-256 of the pickle it converted
+ONNX_SOURCE_HASH_KEY = "source_model_sha256"
+
+
+def file_sha256(path):
+    """Returns the hex SHA-256 digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_model():
+    """Loads the trained forecaster."""
+    # Memory-mapping only helps models that keep plain NumPy arrays (e.g. linear
+    # ones). A random forest's trees copy their node arrays onto the heap when
+    # unpickled, so each process still holds its own copy of those.
+    return joblib.load(MODEL_PATH, mmap_mode="r")
+
+
+@lru_cache(maxsize=1)
+def get_scaler():
+    """Loads the scaler fitted on the training features."""
+    # The scaler's arrays stay memory-mapped; transform only reads them
+    return joblib.load(SCALER_PATH, mmap_mode="r")
+
+
+@lru_cache(maxsize=1)
+def get_onnx_session():
+    """Loads the ONNX export of the model (see export_onnx.py) if it is available.
+
+    The session owns a thread pool, which doesn't survive fork(), so under gunicorn
+    each worker creates its own after forking (see gunicorn.conf.py).
+    """
+    if ort is None or not os.path.exists(ONNX_PATH):
+        return None
+    # gunicorn already runs one worker per core with several threads each, so keep
+    # ONNX Runtime to a single thread per session instead of a pool per core
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+    try:
+        session = ort.InferenceSession(
+            ONNX_PATH, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+    except Exception as e:
+        # A file this runtime can't load (e.g. exported for a newer opset) must not
+        # take the service down; serve the scikit-learn model instead
+        print(f"Could not load ONNX model, using scikit-learn instead: {e}")
+        return None
+
+    # An export left over from before the model was retrained would pair the old
+    # forest with the new scaler, so only serve it if it came from the current pickle
+    metadata = session.get_modelmeta().custom_metadata_map
+    exported_from = metadata.get(ONNX_SOURCE_HASH_KEY)
+    if exported_from != file_sha256(MODEL_PATH):
+        print(
+            "ONNX model was not exported from the current .pkl (re-run export_onnx.py), "
+            "using scikit-learn instead"
+        )
+        return None
+    return session
+
+
+@lru_cache(maxsize=1)
+def get_historical_data():
+    """Loads the historical claims data.
+
+    The same DataFrame is handed to every caller, so it must not be modified.
+    """
+    # pyarrow parses the file in parallel straight into typed columns
+    return pa_csv.read_csv(
+        DATA_PATH,
+        convert_options=pa_csv.ConvertOptions(column_types=COLUMN_TYPES),
+    ).to_pandas()
+
+
+@lru_cache(maxsize=1)
+def get_year_to_row():
+    """Returns a year -> row index lookup into the historical data."""
+    years = get_historical_data()["Year"].to_numpy()
+    return {int(year): i for i, year in enumerate(years)}
+
+
+@lru_cache(maxsize=1)
+def get_feature_matrices():
+    """Returns the raw and scaled lagged feature matrices for every year.
+
+    The data never changes once loaded, so both are built once here and a
+    prediction only picks its rows. Raises ValueError if the data or the scaler
+    don't match the training schema.
+    """
+    scaler = get_scaler()
+    historical_data = get_historical_data()
+
+    # Validate required base columns exist
+    missing = [c for c in BASE_FEATURE_COLS if c not in historical_data.columns]
+    if missing:
+        raise ValueError(f"Missing required columns in data: {missing}")
+
+    # Each year's values are that row's lagged (…_lag1) features
+    X_raw = historical_data[BASE_FEATURE_COLS].to_numpy()
+
+    # Reorder to match the scaler's expected order if available, using a cheap gather
+    if hasattr(scaler, "feature_names_in_"):
+        expected_cols = tuple(scaler.feature_names_in_)
+        missing_expected = [c for c in expected_cols if c not in LAGGED_COLS]
+        if missing_expected:
+            raise ValueError(
+                f"Prepared features missing expected columns: {missing_expected}"
+            )
+        permutation = np.array(
+            [LAGGED_COLS.index(c) for c in expected_cols], dtype=np.intp
+        )
+        X_raw = X_raw[:, permutation]
+        # Pass the column names along so the scaler can still check them
+        X_scaled = scaler.transform(pd.DataFrame(X_raw, columns=expected_cols))
+    else:
+        X_scaled = scaler.transform(X_raw)
+    return X_raw, X_scaled
+
+
+@lru_cache(maxsize=1)
+def get_fused_linear_params():
+    """Returns (weights, intercept) of a linear model with the scaler folded in.
+
+    A linear model on standardized features computes w·((x - μ)/σ) + b, which is
+    the same as (w/σ)·x + (b - Σ wᵢμᵢ/σᵢ), so a prediction becomes a single dot
+    product on raw features. Returns None for any other kind of model.
+    """
+    model = get_model()
+    scaler = get_scaler()
+    if not (
+        hasattr(model, "coef_")
+        and np.ndim(model.coef_) == 1
+        and isinstance(scaler, StandardScaler)
+        and scaler.with_mean
+        and scaler.with_std
+    ):
+        return None
+
+    weights = model.coef_ / scaler.scale_
+    intercept = model.intercept_ - np.dot(model.coef_, scaler.mean_ / scaler.scale_)
+    return weights, intercept
+
+
+@lru_cache(maxsize=1)
+def get_model_version():
+    """Fingerprints the files a forecast depends on.
+
+    Any cached forecast should be invalidated when this changes, i.e. whenever
+    the model, scaler, or data are replaced, or the process switches between
+    serving the ONNX export (float32) and the scikit-learn model (float64).
+    """
+    paths = [MODEL_PATH, SCALER_PATH, DATA_PATH]
+    if get_onnx_session() is not None:
+        paths.append(ONNX_PATH)
+
+    fingerprint = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            fingerprint.update(f.read())
+    return fingerprint.hexdigest()[:16]
+
+
+def preload():
+    """Loads every resource that is safe to share across fork() now.
+
+    The ONNX session is left out: it is created by get_onnx_session() in the
+    process that uses it, e.g. by each gunicorn worker after forking. So is the
+    model version, which depends on whether that session loaded.
+    """
+    get_model()
+    get_scaler()
+    get_historical_data()
+    get_year_to_row()
+    get_feature_matrices()
+    get_fused_linear_params()
+
+
+def predict_rows(rows):
+    """Forecasts claims for the rows at the given positions of the feature matrix.
+
+    Uses the fused linear weights if available, then ONNX Runtime, and otherwise
+    the scikit-learn model on the scaled features.
+    """
+    X_raw, X_scaled = get_feature_matrices()
+    fused = get_fused_linear_params()
+    session = get_onnx_session()
+
+    if fused is None and session is None:
+        return get_model().predict(X_scaled[rows])
+
+    # Match scikit-learn, which refuses to predict on incomplete feature rows
+    if np.isnan(X_raw[rows]).any():
+        raise ValueError("Input X contains NaN.")
+
+    if fused is not None:
+        weights, intercept = fused
+        return X_raw[rows] @ weights + intercept
+    # The ONNX graph takes float32 input
+    input_name = session.get_inputs()[0].name
+    features = X_scaled[rows].astype(np.float32)
+    return session.run(None, {input_name: features})[0].ravel()
+
+
+# The model and data are fixed once loaded, so each year's forecast only needs
+# to be computed once; there is at most one cache entry per year in the CSV
+@lru_cache(maxsize=None)
+def forecast_for_year(year):
+    """Forecasts the following year's claims from the given year's features.
+
+    Raises KeyError for years missing from the data, and ValueError for years
+    the model can't use (e.g. ones with missing values).
+    """
+    row = get_year_to_row()[year]
+    prediction = predict_rows(slice(row, row + 1))
+
+    # The prediction is a numpy array, so we get the first element as a plain
+    # Python float, which rounds and serializes without NumPy's scalar overhead
+    return float(prediction[0])
@@ -1,10 +1,17 @@
 # ui.py
 
 import streamlit as st
-import pandas as pd
-import joblib
 import plotly.graph_objects as go
-import os
+
+from resources import (
+    forecast_for_year,
+    get_historical_data,
+    get_model,
+    get_onnx_session,
+    get_scaler,
+    get_year_to_row,
+    preload,
+)
 
 # --- PAGE CONFIGURATION ---
 # This should be the first Streamlit command in your script.
@@ -16,29 +23,61 @@ st.set_page_config(
 
 
 # --- LOAD MODEL AND DATA ---
-# Use st.cache_data to load the model and data only once
-@st.cache_data
+# The loaders in resources.py cache their results for the whole process, but they
+# don't lock while loading. st.cache_resource does, so running preload() in here
+# stops concurrent first sessions from each loading the model and data.
+@st.cache_resource
 def load_resources():
     """Loads the ML model, scaler, and historical data."""
     try:
-        # Resolve absolute paths relative to this file so it works no matter where it's run from
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        MODELS_DIR = os.path.join(BASE_DIR, "models")
-        DATA_DIR = os.path.join(BASE_DIR, "data")
-
-        model_path = os.path.join(MODELS_DIR, "aggregate_claims_forecaster.pkl")
-        scaler_path = os.path.join(MODELS_DIR, "aggregate_data_scaler.pkl")
-        data_path = os.path.join(DATA_DIR, "aggregate_annual_claims.csv")
-
-        model = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        historical_data = pd.read_csv(data_path)
-        return model, scaler, historical_data
+        preload()
+        get_onnx_session()
+        return get_model(), get_scaler(), get_historical_data()
     except FileNotFoundError:
         st.error(
             "Model or data files not found. Make sure the 'models' and 'data' directories are in the same folder as this script."
         )
         return None, None, None
+    except ValueError as e:
+        # The data or the scaler don't match the training schema
+        st.error(str(e))
+        return None, None, None
+
+
+# The history never changes, so its years only need to be found once.
+# The leading underscore tells Streamlit not to hash the DataFrame on every rerun.
+@st.cache_data
+def get_available_years(_historical_data):
+    """Returns the sorted years present in the historical data."""
+    return tuple(sorted(_historical_data["Year"].unique().tolist()))
+
+
+# The history never changes, so build its chart once and reuse the same figure
+@st.cache_resource
+def build_history_figure(years, values):
+    """Builds the Plotly chart of historical accepted disabling claims."""
+    # Use Plotly for a nice interactive chart
+    fig = go.Figure()
+
+    # Add historical data trace
+    fig.add_trace(
+        go.Scatter(
+            x=years,
+            y=values,
+            mode="lines+markers",
+            name="Actual Claims",
+            line=dict(color="royalblue"),
+        )
+    )
+
+    fig.update_layout(
+        title="Accepted Disabling Claims (1968-2023)",
+        xaxis_title="Year",
+        yaxis_title="Number of Claims",
+        legend_title="Legend",
+        hovermode="x unified",
+    )
+    return fig
 
 
 model, scaler, historical_data = load_resources()
@@ -50,12 +89,12 @@ st.markdown(
     "An AI-powered tool to forecast the number of accepted disabling claims for the upcoming year, built for the Workers Compensation Fund of Tanzania."
 )
 
-if model is not None:
+if model is not None and historical_data is not None:
     # --- USER INPUT ---
     st.sidebar.header("Forecasting Options")
 
     # Get the list of available years from our data
-    available_years = historical_data["Year"].unique()
+    available_years = get_available_years(historical_data)
 
     # Create a dropdown for the user to select the year to use for prediction
     # Default to the most recent year available
@@ -68,57 +107,21 @@ if model is not None:
     # --- MODEL PREDICTION ---
     if st.sidebar.button("Generate Forecast"):
 
-        # 1. Get the data for the selected year
-        latest_year_data = historical_data[historical_data["Year"] == year_to_use]
+        # 1. Find the selected year in the data
+        row = get_year_to_row().get(int(year_to_use))
 
-        if latest_year_data.empty:
+        if row is None:
             st.error(
                 f"No data available for the year {year_to_use}. Please select another year."
             )
         else:
-            # 2. Create the lagged feature vector expected by the scaler/model
-            base_feature_cols = [
-                "Subject employees",
-                "Denied claims",
-                "Fatality claims",
-                "Rate: accepted disabling claims per 100 employees",
-            ]
-
-            # Validate required columns exist in the dataset
-            missing = [
-                c for c in base_feature_cols if c not in latest_year_data.columns
-            ]
-            if missing:
-                st.error(f"Missing required columns in data: {missing}")
+            # 2. Make a prediction (computed once per year, then cached)
+            try:
+                forecast = forecast_for_year(int(year_to_use))
+            except ValueError as e:
+                st.error(str(e))
                 st.stop()
 
-            # Construct single-row DataFrame with lagged column names using selected year's values
-            lagged_feature_row = {
-                f"{col}_lag1": latest_year_data.iloc[0][col]
-                for col in base_feature_cols
-            }
-            feature_vector = pd.DataFrame([lagged_feature_row])
-
-            # Reorder to match scaler's expected order if available
-            if hasattr(scaler, "feature_names_in_"):
-                expected_cols = list(scaler.feature_names_in_)
-                missing_expected = [
-                    c for c in expected_cols if c not in feature_vector.columns
-                ]
-                if missing_expected:
-                    st.error(
-                        f"Prepared features missing expected columns: {missing_expected}"
-                    )
-                    st.stop()
-                feature_vector = feature_vector[expected_cols]
-
-            # 3. Scale the features
-            scaled_feature_vector = scaler.transform(feature_vector)
-
-            # 4. Make a prediction
-            prediction = model.predict(scaled_feature_vector)
-            forecast = prediction[0]
-
             # --- DISPLAY RESULTS ---
             st.header(f"📈 Forecast for {year_to_use + 1}")
 
@@ -132,7 +135,9 @@ if model is not None:
             )
 
             # Show the previous year's actuals for comparison
-            previous_year_actual = latest_year_data["Accepted disabling claims"].iloc[0]
+            previous_year_actual = float(
+                historical_data["Accepted disabling claims"].iloc[row]
+            )
             col2.metric(
                 label=f"Actual Claims in {year_to_use}",
                 value=f"{int(previous_year_actual):,}",
@@ -144,28 +149,12 @@ if model is not None:
     # --- VISUALIZATION ---
     st.header("Historical Data Trends")
 
-    # Use Plotly for a nice interactive chart
-    fig = go.Figure()
-
-    # Add historical data trace
-    fig.add_trace(
-        go.Scatter(
-            x=historical_data["Year"],
-            y=historical_data["Accepted disabling claims"],
-            mode="lines+markers",
-            name="Actual Claims",
-            line=dict(color="royalblue"),
-        )
-    )
-
-    fig.update_layout(
-        title="Accepted Disabling Claims (1968-2023)",
-        xaxis_title="Year",
-        yaxis_title="Number of Claims",
-        legend_title="Legend",
-        hovermode="x unified",
+    # NumPy views of the columns avoid a copy here, and Plotly encodes arrays
+    # much faster than it iterates over pandas Series
+    fig = build_history_figure(
+        historical_data["Year"].to_numpy(),
+        historical_data["Accepted disabling claims"].to_numpy(),
     )
-
     st.plotly_chart(fig, use_container_width=True)
 
 else: